@@ -1,105 +1,146 @@
 # Ex: python script.py base_cert.jpg names.txt 900 510 64 "Project Exhibition" 930 600 52 "II" 915 715 42
 
+import contextlib
+import functools
+import io
+import math
 import os
-import time
-import uuid
 from PIL import Image, ImageDraw, ImageFont
+from reportlab import rl_config
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter, landscape
+from reportlab.lib.utils import ImageReader
 import sys
 import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from tqdm import tqdm
+
+# The certificate's JPEG data is embedded as a binary DCT stream; skip ReportLab's
+# extra ASCII85 encoding pass over it
+rl_config.useA85 = 0
+
+# Older Pillow versions (< 10) measure text with textsize/getsize instead of getbbox;
+# this does not change while the script runs, so check it only once
+_HAS_TEXTSIZE = hasattr(ImageDraw.ImageDraw, 'textsize')
+
+# Spaces and characters that are not allowed in file names (or would act as path
+# separators) all become underscores in the output PDF name
+_FILENAME_TRANS = str.maketrans({c: '_' for c in ' /\\:*?"<>|'})
+
+# System font used when no usable font is given, picked once for this platform.
+# Pillow looks bare file names up in the platform's font directories
+_SYSTEM_FONTS = {
+    'win32': 'arial.ttf',
+    'darwin': 'Arial.ttf',
+}
+_DEFAULT_FONT_PATH = _SYSTEM_FONTS.get(sys.platform, 'DejaVuSans.ttf')
+
+# FreeType faces are expensive to build, so load each (font, size) pair only once per run
+@functools.lru_cache(maxsize=32)
+def _get_font(path, size):
+    return ImageFont.truetype(path, size=size)
+
+def _render_text_mask(text, font, position, bbox=None):
+    # Rasterize the glyph coverage of the text into a single-channel mask only as big
+    # as its bounding box. Returns the mask and the integer position to paste the ink
+    # through it at, so the result matches drawing the text at `position` directly
+    # (sub-pixel offset included). Pass the bbox if the caller already measured it
+    left, top, right, bottom = bbox if bbox is not None else font.getbbox(text)
+    frac_x, int_x = math.modf(position[0])
+    frac_y, int_y = math.modf(position[1])
+    mask = Image.new("L", (right - left + 1, bottom - top + 1), 0)
+    ImageDraw.Draw(mask).text((frac_x - left, frac_y - top), text, fill=255, font=font)
+    return mask, (int(int_x) + left, int(int_y) + top)
+
+def _render_centered_text(text, position, font_size):
+    try:
+        # Try to use system font with specified size
+        font = _get_font(_DEFAULT_FONT_PATH, font_size)
+    except Exception as e:
+        print(f"Error loading font: {e}, falling back to default")
+        font = ImageFont.load_default()
+    
+    # Calculate text dimensions to center it
+    # (draw.textsize on older Pillow versions is font.getsize for a single line)
+    if _HAS_TEXTSIZE:
+        text_width, text_height = font.getsize(text)
+        bbox = None
+    else:
+        bbox = font.getbbox(text)
+        text_width, text_height = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    
+    # Calculate the position for centered text
+    x, y = position
+    x_centered = x - (text_width / 2)
+    
+    return _render_text_mask(text, font, (x_centered, y), bbox)
+
+def _compute_page_layout(image_size):
+    # Landscape page the certificate is placed on
+    pagesize = landscape(letter)  # This creates a landscape orientation
+    width, height = pagesize  # Note that width and height are swapped in landscape mode
+    img_width, img_height = image_size
+    
+    # Calculate scaling to fit the image on the PDF page
+    ratio = min(width/img_width, height/img_height)
+    img_width = img_width * ratio
+    img_height = img_height * ratio
+    
+    # Center the image on the page
+    x_centered = (width - img_width) / 2
+    y_centered = (height - img_height) / 2
+    
+    return pagesize, x_centered, y_centered, img_width, img_height
+
+def _render_certificate(base_img, static_overlays, name, name_position, name_font_size):
+    # Create a copy of the already decoded base image to work with
+    img_copy = base_img.copy()
+    
+    # Only the name differs between certificates, so it is the only text rendered here
+    mask, paste_position = _render_centered_text(name, name_position, name_font_size)
+    img_copy.paste("black", paste_position, mask)
+    
+    # The event name and rank were rendered once up front, just paste them
+    for mask, paste_position in static_overlays:
+        img_copy.paste("black", paste_position, mask)
+    
+    return img_copy
+
+def _encode_certificate_jpeg(img):
+    # Encode the certificate as JPEG in memory instead of through a temporary file;
+    # ReportLab embeds JPEG data as-is (DCT), which is far smaller and quicker than
+    # having it Flate-compress the raw pixels
+    jpeg_buffer = io.BytesIO()
+    img.save(jpeg_buffer, format="JPEG")
+    jpeg_buffer.seek(0)
+    return jpeg_buffer
+
+def _draw_certificate_page(c, jpeg_buffer, page_layout):
+    pagesize, x_centered, y_centered, img_width, img_height = page_layout
+    c.drawImage(ImageReader(jpeg_buffer), x_centered, y_centered, width=img_width, height=img_height)
 
 def add_texts_to_image_and_convert_to_pdf(
-    image_path, 
-    name, name_position, name_font_size,
-    event_name, event_position, event_font_size,
-    rank, rank_position, rank_font_size
+    base_img, static_overlays, page_layout,
+    name, name_position, name_font_size
 ):
     try:
-        # Generate a unique temporary filename to avoid conflicts
-        unique_id = str(uuid.uuid4())[:8]
-        temp_image_path = f"temp_with_text_{unique_id}.jpg"
-        
-        # Open the image
-        with Image.open(image_path) as img:
-            # Create a copy of the image to work with
-            img_copy = img.copy()
-        
-        # Create a drawing object
-        draw = ImageDraw.Draw(img_copy)
-        
-        # Get system font based on platform
-        system_fonts = {
-            'windows': 'arial.ttf'
-        }
-        
-        default_font_path = system_fonts['windows']
-        
-        # Function to add centered text with specified font size
-        def add_centered_text(text, position, font_size):
-            try:
-                # Try to use system font with specified size
-                font = ImageFont.truetype(default_font_path, size=font_size)
-            except Exception as e:
-                print(f"Error loading font: {e}, falling back to default")
-                font = ImageFont.load_default()
-            
-            # Calculate text dimensions to center it
-            if hasattr(draw, 'textsize'):
-                text_width, text_height = draw.textsize(text, font=font)
-            else:
-                bbox = font.getbbox(text)
-                text_width, text_height = bbox[2] - bbox[0], bbox[3] - bbox[1]
-            
-            # Calculate the position for centered text
-            x, y = position
-            x_centered = x - (text_width / 2)
-            
-            # Add text to the image with center alignment
-            draw.text((x_centered, y), text, fill="black", font=font)
-        
-        # Add all text elements to the image
-        add_centered_text(name, name_position, name_font_size)
-        add_centered_text(event_name, event_position, event_font_size)
-        add_centered_text(rank, rank_position, rank_font_size)
-        
-        # Save the modified image
-        img_copy.save(temp_image_path)
+        img_copy = _render_certificate(base_img, static_overlays, name, name_position, name_font_size)
+        jpeg_buffer = _encode_certificate_jpeg(img_copy)
         
         # Use the provided name as the filename for the PDF
-        output_pdf = f"{name.strip().replace(' ', '_')}.pdf"
+        output_pdf = f"{name.strip().translate(_FILENAME_TRANS)}.pdf"
         
-        # Convert the image to PDF with landscape orientation
-        pagesize = landscape(letter)  # This creates a landscape orientation
-        c = canvas.Canvas(output_pdf, pagesize=pagesize)
-        width, height = pagesize  # Note that width and height are swapped in landscape mode
-        
-        # Open the temp image to get its dimensions
-        with Image.open(temp_image_path) as img:
-            img_width, img_height = img.size
-            
-            # Calculate scaling to fit the image on the PDF page
-            ratio = min(width/img_width, height/img_height)
-            img_width = img_width * ratio
-            img_height = img_height * ratio
-            
-            # Center the image on the page
-            x_centered = (width - img_width) / 2
-            y_centered = (height - img_height) / 2
+        # Build the PDF in memory so the file is only created once the data is complete
+        pdf_buffer = io.BytesIO()
+        c = canvas.Canvas(pdf_buffer, pagesize=page_layout[0])
         
         # Add the image to the PDF
-        c.drawImage(temp_image_path, x_centered, y_centered, width=img_width, height=img_height)
+        _draw_certificate_page(c, jpeg_buffer, page_layout)
         c.save()
         
-        # Small delay to ensure file operations are complete
-        time.sleep(0.5)
-        
-        # Try to remove the temporary image file
-        try:
-            os.remove(temp_image_path)
-        except Exception as e:
-            print(f"Warning: Could not delete temporary file {temp_image_path}: {e}")
-            print("You may need to delete it manually later.")
+        with open(output_pdf, 'wb') as pdf_file:
+            pdf_file.write(pdf_buffer.getvalue())
         
         return output_pdf
     
@@ -108,19 +149,66 @@ def add_texts_to_image_and_convert_to_pdf(
         traceback.print_exc()
         return None
 
+def _load_base_image(image_path):
+    base_img = Image.open(image_path)
+    # load() decodes the pixels and releases the file handle
+    base_img.load()
+    # Bring the base into RGB once, so neither the text compositing nor ReportLab
+    # has to convert a palette/alpha/other-mode copy for every certificate
+    if base_img.mode != "RGB":
+        base_img = base_img.convert("RGB")
+    return base_img
+
+@contextlib.contextmanager
+def _shared_base_image(base_img):
+    # Copy the decoded pixels into shared memory once; the workers rebuild the base
+    # certificate from there instead of each decoding the image file again
+    data = base_img.tobytes()
+    shm = shared_memory.SharedMemory(create=True, size=len(data))
+    try:
+        shm.buf[:len(data)] = data
+        # Release the temporary copy; it would otherwise stay alive in this suspended
+        # generator for the whole run
+        del data
+        yield shm.name
+    finally:
+        shm.close()
+        shm.unlink()
+
+# Base certificate rebuilt from shared memory in each worker process, plus the shared
+# text overlays and page layout
+_worker_base_img = None
+_worker_static_overlays = None
+_worker_page_layout = None
+
+def _init_worker(shm_name, image_size, static_overlays, page_layout):
+    global _worker_base_img, _worker_static_overlays, _worker_page_layout
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        # frombytes copies the pixels, so the shared block can be closed right away
+        _worker_base_img = Image.frombytes("RGB", image_size, shm.buf)
+    finally:
+        shm.close()
+    _worker_static_overlays = static_overlays
+    _worker_page_layout = page_layout
+
+def _add_texts_in_worker(*args):
+    return add_texts_to_image_and_convert_to_pdf(
+        _worker_base_img, _worker_static_overlays, _worker_page_layout, *args
+    )
+
 def title_case_name(name):
-    # Split the name into words and apply title case to each word
-    words = name.strip().split()
-    title_cased_words = [word.capitalize() for word in words]
-    
-    # Join the words back together
-    return ' '.join(title_cased_words)
+    # Capitalize each whitespace-separated word and join them with single spaces.
+    # str.title() is not used because it also capitalizes after apostrophes and
+    # hyphens ("O'neil" -> "O'Neil")
+    return ' '.join(map(str.capitalize, name.split()))
 
 def process_names_from_file(
     image_path, names_file, 
     name_position, name_font_size,
     event_name, event_position, event_font_size,
-    rank, rank_position, rank_font_size
+    rank, rank_position, rank_font_size,
+    combined_pdf=None
 ):
     successful = 0
     failed = 0
@@ -133,26 +221,81 @@ def process_names_from_file(
         total_names = len(names)
         print(f"Found {total_names} names in {names_file}")
         
-        for i, raw_name in enumerate(names, 1):
-            # Convert name to title case (first letter of each word capitalized)
-            properly_cased_name = title_case_name(raw_name)
-            
-            print(f"Processing {i}/{total_names}: '{raw_name}' → '{properly_cased_name}'")
-            print(f"  Event: '{event_name}', Rank: '{rank}'")
-            
-            result = add_texts_to_image_and_convert_to_pdf(
-                image_path, 
-                properly_cased_name, name_position, name_font_size,
-                event_name, event_position, event_font_size,
-                rank, rank_position, rank_font_size
-            )
+        # Convert names to title case (first letter of each word capitalized)
+        properly_cased_names = [title_case_name(raw_name) for raw_name in names]
+        
+        # Decode the base certificate once; the page layout only depends on its size
+        base_img = _load_base_image(image_path)
+        page_layout = _compute_page_layout(base_img.size)
+        
+        # The event name and rank are the same on every certificate, so render them only once
+        static_overlays = [
+            _render_centered_text(event_name, event_position, event_font_size),
+            _render_centered_text(rank, rank_position, rank_font_size),
+        ]
+        
+        if combined_pdf:
+            # One page per name in a single PDF, built in this process since the canvas
+            # cannot be shared with worker processes
+            c = canvas.Canvas(combined_pdf, pagesize=page_layout[0])
+            for properly_cased_name in tqdm(properly_cased_names, desc="Certificates"):
+                # Render and encode before touching the canvas, so a failure here
+                # leaves no half-drawn page behind
+                try:
+                    img = _render_certificate(
+                        base_img, static_overlays, properly_cased_name, name_position, name_font_size
+                    )
+                    jpeg_buffer = _encode_certificate_jpeg(img)
+                except Exception as e:
+                    tqdm.write(f"  ✗ Failed to create page for: {properly_cased_name} ({e})")
+                    failed += 1
+                    continue
+                
+                try:
+                    _draw_certificate_page(c, jpeg_buffer, page_layout)
+                    successful += 1
+                except Exception as e:
+                    tqdm.write(f"  ✗ Failed to create page for: {properly_cased_name} ({e})")
+                    failed += 1
+                finally:
+                    # Always close the page, so the next name never lands on this one
+                    c.showPage()
             
-            if result:
-                print(f"  ✓ PDF created successfully: {result}")
-                successful += 1
+            if successful:
+                c.save()
+                print(f"\nCombined PDF created: {combined_pdf}")
             else:
-                print(f"  ✗ Failed to create PDF for: {properly_cased_name}")
-                failed += 1
+                print(f"\nNo certificate could be rendered, so {combined_pdf} was not written")
+        else:
+            # Every certificate is independent, so render them in parallel processes
+            max_workers = max(1, min(total_names, os.cpu_count() or 1))
+            with _shared_base_image(base_img) as shm_name, ProcessPoolExecutor(
+                max_workers=max_workers, initializer=_init_worker,
+                initargs=(shm_name, base_img.size, static_overlays, page_layout)
+            ) as executor:
+                futures = {}
+                for properly_cased_name in properly_cased_names:
+                    future = executor.submit(
+                        _add_texts_in_worker, properly_cased_name, name_position, name_font_size
+                    )
+                    futures[future] = properly_cased_name
+                
+                # A single in-place progress bar instead of several lines per certificate
+                for future in tqdm(as_completed(futures), total=total_names, desc="Certificates"):
+                    # A crashed worker (e.g. BrokenProcessPool) only fails its own name
+                    # instead of aborting the run before the summary
+                    try:
+                        output_pdf = future.result()
+                    except Exception as e:
+                        tqdm.write(f"  ✗ Failed to create PDF for: {futures[future]} ({e})")
+                        failed += 1
+                        continue
+                    
+                    if output_pdf:
+                        successful += 1
+                    else:
+                        tqdm.write(f"  ✗ Failed to create PDF for: {futures[future]}")
+                        failed += 1
         
         print("\nSummary:")
         print(f"  Successful: {successful}/{total_names}")
@@ -163,17 +306,21 @@ def process_names_from_file(
         traceback.print_exc()
 
 def main():
-    if len(sys.argv) < 11:
+    if len(sys.argv) < 14:
         print("""
 Usage: python script.py <image_path> <names_file> 
                        <name_x> <name_y> <name_font_size>
                        <event_name> <event_x> <event_y> <event_font_size>
                        <rank> <rank_x> <rank_y> <rank_font_size>
+                       [combined_pdf]
                        
 Example: python script.py certificate.jpg names.txt 
                           500 300 36
                           "Annual Science Competition" 500 200 24
                           "First Prize" 500 400 20
+
+Pass combined_pdf (e.g. all_certificates.pdf) to get every certificate as a page
+of that single PDF instead of one PDF per name.
         """)
         return
     
@@ -198,18 +345,26 @@ Example: python script.py certificate.jpg names.txt
     rank_y = int(sys.argv[12])
     rank_font_size = int(sys.argv[13])
     
+    # Optional single output PDF with one page per name
+    combined_pdf = None
+    if len(sys.argv) >= 15:
+        combined_pdf = sys.argv[14]
+    
     print(f"Image: {image_path}")
     print(f"Names file: {names_file}")
     print(f"Name position: ({name_x}, {name_y}), Font size: {name_font_size}")
     print(f"Event: '{event_name}', Position: ({event_x}, {event_y}), Font size: {event_font_size}")
     print(f"Rank: '{rank}', Position: ({rank_x}, {rank_y}), Font size: {rank_font_size}")
+    if combined_pdf:
+        print(f"Combined PDF: {combined_pdf}")
     
     # Process all names with the specified settings
     process_names_from_file(
         image_path, names_file,
         (name_x, name_y), name_font_size,
         event_name, (event_x, event_y), event_font_size,
-        rank, (rank_x, rank_y), rank_font_size
+        rank, (rank_x, rank_y), rank_font_size,
+        combined_pdf
     )
 
 if __name__ == "__main__":